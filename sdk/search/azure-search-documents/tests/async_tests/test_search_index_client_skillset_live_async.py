@@ -4,18 +4,22 @@
 # license information.
 # --------------------------------------------------------------------------
 import asyncio
+import atexit
 import functools
-import json
-from os.path import dirname, join, realpath
+from pathlib import Path
+import sys
 import time
 
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
 import pytest
 from azure.core import MatchConditions
 from azure.core.credentials import AzureKeyCredential
-from devtools_testutils import AzureMgmtTestCase
-
-from azure_devtools.scenario_tests import ReplayableTest
-from azure_devtools.scenario_tests.utilities import trim_kwargs_from_test_function
+from devtools_testutils import AzureMgmtRecordedTestCase
+from devtools_testutils.aio import recorded_by_proxy_async
 
 from search_service_preparer import SearchServicePreparer, SearchResourceGroupPreparer
 
@@ -32,31 +36,109 @@ from azure.search.documents.indexes.models import(
 )
 from azure.search.documents.indexes.aio import SearchIndexerClient
 
-CWD = dirname(realpath(__file__))
-SCHEMA = open(join(CWD, "..", "hotel_schema.json")).read()
-BATCH = json.load(open(join(CWD, "..", "hotel_small.json"), encoding='utf-8'))
+_HERE = Path(__file__).resolve().parent
+_SCHEMA_PATH = _HERE.parent / "hotel_schema.json"
+_BATCH_PATH = _HERE.parent / "hotel_small.json"
 TIME_TO_SLEEP = 5
+POLL_INTERVAL = 0.25
+
+# bound once so the polling loop doesn't repeat the attribute lookups
+_monotonic = time.monotonic
+_sleep = asyncio.sleep
+_gather = asyncio.gather
+
+# Only this module's loop comes from uvloop; the global loop policy is left untouched
+# so other async test modules keep running on whatever loop they get.
+_new_event_loop = asyncio.new_event_loop
+if sys.platform != "win32":
+    try:
+        import uvloop
+        _new_event_loop = uvloop.new_event_loop
+    except ImportError:
+        pass
+
+# one loop for the whole module, used explicitly by await_prepared_test; it is never
+# installed as the current loop, so other modules' preparers are unaffected
+_LOOP = _new_event_loop()
+atexit.register(_LOOP.close)
 
 def await_prepared_test(test_fn):
-    """Synchronous wrapper for async test methods. Used to avoid making changes
-    upstream to AbstractPreparer (which doesn't await the functions it wraps)
+    """Synchronous wrapper for async test methods that runs them on this module's loop.
+    The preparers call sync tests directly instead of driving them on get_event_loop().
     """
 
     @functools.wraps(test_fn)
     def run(test_class_instance, *args, **kwargs):
-        trim_kwargs_from_test_function(test_fn, kwargs)
-        loop = asyncio.get_event_loop()
-        return loop.run_until_complete(test_fn(test_class_instance, **kwargs))
+        return _LOOP.run_until_complete(test_fn(test_class_instance, *args, **kwargs))
 
     return run
 
-class SearchSkillsetClientTest(AzureMgmtTestCase):
-    FILTER_HEADERS = ReplayableTest.FILTER_HEADERS + ['api-key']
-
-    @SearchResourceGroupPreparer(random_name_enabled=True)
-    @SearchServicePreparer(schema=SCHEMA, index_batch=BATCH)
+@functools.lru_cache(maxsize=1)
+def _schema():
+    return _json_loads(_SCHEMA_PATH.read_bytes())
+
+@functools.lru_cache(maxsize=1)
+def _batch():
+    # only called by the preparer on live runs; playback never reads the batch
+    return _json_loads(_BATCH_PATH.read_bytes())
+
+# the skill inputs/outputs are never modified by the client, so every test can share them
+_DEFAULT_INPUTS = [InputFieldMappingEntry(name="text", source="/document/content")]
+_DEFAULT_OUTPUTS = [OutputFieldMappingEntry(name="organizations", target_name="organizations")]
+
+def _default_skill():
+    return EntityRecognitionSkill(inputs=_DEFAULT_INPUTS, outputs=_DEFAULT_OUTPUTS)
+
+@pytest.mark.usefixtures("add_sanitizers")
+class TestSearchSkillsetClient(AzureMgmtRecordedTestCase):
+    # Every test shares one cached search service, so they also share one client (and its
+    # aiohttp connection pool) per endpoint. The clients live on _LOOP like the tests do.
+    _clients = {}
+
+    @pytest.fixture(scope="class", autouse=True)
+    def close_clients(self):
+        yield
+        for client in self._clients.values():
+            _LOOP.run_until_complete(client.close())
+        self._clients.clear()
+
+    def _get_client(self, endpoint, api_key):
+        try:
+            return self._clients[endpoint]
+        except KeyError:
+            client = self._clients[endpoint] = SearchIndexerClient(endpoint, AzureKeyCredential(api_key))
+            return client
+
+    async def _reset_skillsets(self, client):
+        # The search service is cached and shared by every test in the class,
+        # so clear out skillsets left behind by earlier tests first.
+        skillsets = await client.get_skillsets()
+        if skillsets:
+            await _gather(*(client.delete_skillset(skillset) for skillset in skillsets))
+            remaining = await self._wait_for_skillsets_deleted(client)
+            assert not remaining, "Skillsets left over from earlier tests were not deleted: {}".format(
+                [skillset.name for skillset in remaining]
+            )
+
+    async def _wait_for_skillsets_deleted(self, client):
+        # Poll until the delete is visible rather than sleeping for the whole TIME_TO_SLEEP.
+        # Playback replays the same list calls, so it only skips the waits.
+        # Returns the skillsets still listed when polling stopped.
+        deadline = _monotonic() + TIME_TO_SLEEP
+        while True:
+            skillsets = await client.get_skillsets()
+            if not skillsets or _monotonic() >= deadline:
+                return skillsets
+            if self.is_live:
+                await _sleep(POLL_INTERVAL)
+
+    @SearchResourceGroupPreparer(random_name_enabled=True, use_cache=True)
+    @SearchServicePreparer(schema=_schema, index_batch=_batch, use_cache=True)
+    @await_prepared_test
+    @recorded_by_proxy_async
     async def test_create_skillset(self, api_key, endpoint, index_name, **kwargs):
-        client = SearchIndexerClient(endpoint, AzureKeyCredential(api_key))
+        client = self._get_client(endpoint, api_key)
+        await self._reset_skillsets(client)
         name = "test-ss"
 
         s1 = EntityRecognitionSkill(name="skill1",
@@ -92,71 +174,75 @@ class SearchSkillsetClientTest(AzureMgmtTestCase):
                                 outputs=[OutputFieldMappingEntry(name="entities", target_name="entitiesS5")],
                                 minimum_precision=0.5)
 
-        skillset = SearchIndexerSkillset(name=name, skills=list([s1, s2, s3, s4, s5]), description="desc")
+        skillset = SearchIndexerSkillset(name=name, skills=[s1, s2, s3, s4, s5], description="desc")
         result = await client.create_skillset(skillset)
 
         assert isinstance(result, SearchIndexerSkillset)
         assert result.name == "test-ss"
         assert result.description == "desc"
         assert result.e_tag
-        assert len(result.skills) == 5
-        assert isinstance(result.skills[0], EntityRecognitionSkill)
-        assert result.skills[0].skill_version == EntityRecognitionSkillVersion.V1
-        assert isinstance(result.skills[1], EntityRecognitionSkill)
-        assert result.skills[1].skill_version == EntityRecognitionSkillVersion.V3
-        assert isinstance(result.skills[2], SentimentSkill)
-        assert result.skills[2].skill_version == SentimentSkillVersion.V1
-        assert isinstance(result.skills[3], SentimentSkill)
-        assert result.skills[3].skill_version == SentimentSkillVersion.V3
-        assert isinstance(result.skills[4], EntityLinkingSkill)
-        assert result.skills[4].minimum_precision == 0.5
+        expected = (
+            (EntityRecognitionSkill, "skill_version", EntityRecognitionSkillVersion.V1),
+            (EntityRecognitionSkill, "skill_version", EntityRecognitionSkillVersion.V3),
+            (SentimentSkill, "skill_version", SentimentSkillVersion.V1),
+            (SentimentSkill, "skill_version", SentimentSkillVersion.V3),
+            (EntityLinkingSkill, "minimum_precision", 0.5),
+        )
+        assert len(result.skills) == len(expected)
+        for skill, (skill_type, attr, value) in zip(result.skills, expected):
+            assert isinstance(skill, skill_type)
+            assert getattr(skill, attr) == value
 
         assert len(await client.get_skillsets()) == 1
 
         await client.reset_skills(result, [x.name for x in result.skills])
 
-    @SearchResourceGroupPreparer(random_name_enabled=True)
-    @SearchServicePreparer(schema=SCHEMA, index_batch=BATCH)
+    @SearchResourceGroupPreparer(random_name_enabled=True, use_cache=True)
+    @SearchServicePreparer(schema=_schema, index_batch=_batch, use_cache=True)
+    @await_prepared_test
+    @recorded_by_proxy_async
     async def test_delete_skillset(self, api_key, endpoint, index_name, **kwargs):
-        client = SearchIndexerClient(endpoint, AzureKeyCredential(api_key))
-        s = EntityRecognitionSkill(inputs=[InputFieldMappingEntry(name="text", source="/document/content")],
-                                   outputs=[OutputFieldMappingEntry(name="organizations", target_name="organizations")])
+        client = self._get_client(endpoint, api_key)
+        await self._reset_skillsets(client)
+        s = _default_skill()
 
-        skillset = SearchIndexerSkillset(name='test-ss', skills=list([s]), description="desc")
-        result = await client.create_skillset(skillset)
+        skillset = SearchIndexerSkillset(name='test-ss', skills=[s], description="desc")
+        await client.create_skillset(skillset)
         assert len(await client.get_skillsets()) == 1
 
         await client.delete_skillset("test-ss")
-        if self.is_live:
-            time.sleep(TIME_TO_SLEEP)
-        assert len(await client.get_skillsets()) == 0
+        assert not await self._wait_for_skillsets_deleted(client)
 
-    @SearchResourceGroupPreparer(random_name_enabled=True)
-    @SearchServicePreparer(schema=SCHEMA, index_batch=BATCH)
+    @SearchResourceGroupPreparer(random_name_enabled=True, use_cache=True)
+    @SearchServicePreparer(schema=_schema, index_batch=_batch, use_cache=True)
+    @await_prepared_test
+    @recorded_by_proxy_async
     async def test_delete_skillset_if_unchanged(self, api_key, endpoint, index_name, **kwargs):
-        client = SearchIndexerClient(endpoint, AzureKeyCredential(api_key))
-        s = EntityRecognitionSkill(inputs=[InputFieldMappingEntry(name="text", source="/document/content")],
-                                   outputs=[OutputFieldMappingEntry(name="organizations", target_name="organizations")])
+        client = self._get_client(endpoint, api_key)
+        await self._reset_skillsets(client)
+        s = _default_skill()
 
-        skillset = SearchIndexerSkillset(name='test-ss', skills=list([s]), description="desc")
+        skillset = SearchIndexerSkillset(name='test-ss', skills=[s], description="desc")
         result = await client.create_skillset(skillset)
         etag = result.e_tag
 
-        skillset1 = SearchIndexerSkillset(name='test-ss', skills=list([s]), description="updated")
+        skillset1 = SearchIndexerSkillset(name='test-ss', skills=[s], description="updated")
         updated = await client.create_or_update_skillset(skillset1)
         updated.e_tag = etag
 
         with pytest.raises(HttpResponseError):
             await client.delete_skillset(updated, match_condition=MatchConditions.IfNotModified)
 
-    @SearchResourceGroupPreparer(random_name_enabled=True)
-    @SearchServicePreparer(schema=SCHEMA, index_batch=BATCH)
+    @SearchResourceGroupPreparer(random_name_enabled=True, use_cache=True)
+    @SearchServicePreparer(schema=_schema, index_batch=_batch, use_cache=True)
+    @await_prepared_test
+    @recorded_by_proxy_async
     async def test_get_skillset(self, api_key, endpoint, index_name, **kwargs):
-        client = SearchIndexerClient(endpoint, AzureKeyCredential(api_key))
-        s = EntityRecognitionSkill(inputs=[InputFieldMappingEntry(name="text", source="/document/content")],
-                                   outputs=[OutputFieldMappingEntry(name="organizations", target_name="organizations")])
+        client = self._get_client(endpoint, api_key)
+        await self._reset_skillsets(client)
+        s = _default_skill()
 
-        skillset = SearchIndexerSkillset(name='test-ss', skills=list([s]), description="desc")
+        skillset = SearchIndexerSkillset(name='test-ss', skills=[s], description="desc")
         await client.create_skillset(skillset)
         assert len(await client.get_skillsets()) == 1
 
@@ -168,32 +254,35 @@ class SearchSkillsetClientTest(AzureMgmtTestCase):
         assert len(result.skills) == 1
         assert isinstance(result.skills[0], EntityRecognitionSkill)
 
-    @SearchResourceGroupPreparer(random_name_enabled=True)
-    @SearchServicePreparer(schema=SCHEMA, index_batch=BATCH)
+    @SearchResourceGroupPreparer(random_name_enabled=True, use_cache=True)
+    @SearchServicePreparer(schema=_schema, index_batch=_batch, use_cache=True)
+    @await_prepared_test
+    @recorded_by_proxy_async
     async def test_get_skillsets(self, api_key, endpoint, index_name, **kwargs):
-        client = SearchIndexerClient(endpoint, AzureKeyCredential(api_key))
-        s = EntityRecognitionSkill(inputs=[InputFieldMappingEntry(name="text", source="/document/content")],
-                                   outputs=[OutputFieldMappingEntry(name="organizations", target_name="organizations")])
-
-        skillset1 = SearchIndexerSkillset(name='test-ss-1', skills=list([s]), description="desc1")
-        await client.create_skillset(skillset1)
-        skillset2 = SearchIndexerSkillset(name='test-ss-2', skills=list([s]), description="desc2")
-        await client.create_skillset(skillset2)
+        client = self._get_client(endpoint, api_key)
+        await self._reset_skillsets(client)
+        s = _default_skill()
+
+        skillset1 = SearchIndexerSkillset(name='test-ss-1', skills=[s], description="desc1")
+        skillset2 = SearchIndexerSkillset(name='test-ss-2', skills=[s], description="desc2")
+        await _gather(client.create_skillset(skillset1), client.create_skillset(skillset2))
         result = await client.get_skillsets()
         assert isinstance(result, list)
         assert all(isinstance(x, SearchIndexerSkillset) for x in result)
         assert set(x.name for x in result) == {"test-ss-1", "test-ss-2"}
 
-    @SearchResourceGroupPreparer(random_name_enabled=True)
-    @SearchServicePreparer(schema=SCHEMA, index_batch=BATCH)
+    @SearchResourceGroupPreparer(random_name_enabled=True, use_cache=True)
+    @SearchServicePreparer(schema=_schema, index_batch=_batch, use_cache=True)
+    @await_prepared_test
+    @recorded_by_proxy_async
     async def test_create_or_update_skillset(self, api_key, endpoint, index_name, **kwargs):
-        client = SearchIndexerClient(endpoint, AzureKeyCredential(api_key))
-        s = EntityRecognitionSkill(inputs=[InputFieldMappingEntry(name="text", source="/document/content")],
-                                   outputs=[OutputFieldMappingEntry(name="organizations", target_name="organizations")])
+        client = self._get_client(endpoint, api_key)
+        await self._reset_skillsets(client)
+        s = _default_skill()
 
-        skillset1 = SearchIndexerSkillset(name='test-ss', skills=list([s]), description="desc1")
+        skillset1 = SearchIndexerSkillset(name='test-ss', skills=[s], description="desc1")
         await client.create_or_update_skillset(skillset1)
-        skillset2 = SearchIndexerSkillset(name='test-ss', skills=list([s]), description="desc2")
+        skillset2 = SearchIndexerSkillset(name='test-ss', skills=[s], description="desc2")
         await client.create_or_update_skillset(skillset2)
         assert len(await client.get_skillsets()) == 1
 
@@ -202,14 +291,16 @@ class SearchSkillsetClientTest(AzureMgmtTestCase):
         assert result.name == "test-ss"
         assert result.description == "desc2"
 
-    @SearchResourceGroupPreparer(random_name_enabled=True)
-    @SearchServicePreparer(schema=SCHEMA, index_batch=BATCH)
+    @SearchResourceGroupPreparer(random_name_enabled=True, use_cache=True)
+    @SearchServicePreparer(schema=_schema, index_batch=_batch, use_cache=True)
+    @await_prepared_test
+    @recorded_by_proxy_async
     async def test_create_or_update_skillset_inplace(self, api_key, endpoint, index_name, **kwargs):
-        client = SearchIndexerClient(endpoint, AzureKeyCredential(api_key))
-        s = EntityRecognitionSkill(inputs=[InputFieldMappingEntry(name="text", source="/document/content")],
-                                   outputs=[OutputFieldMappingEntry(name="organizations", target_name="organizations")])
+        client = self._get_client(endpoint, api_key)
+        await self._reset_skillsets(client)
+        s = _default_skill()
 
-        skillset1 = SearchIndexerSkillset(name='test-ss', skills=list([s]), description="desc1")
+        skillset1 = SearchIndexerSkillset(name='test-ss', skills=[s], description="desc1")
         ss = await client.create_or_update_skillset(skillset1)
         skillset2 = SearchIndexerSkillset(name='test-ss', skills=[s], description="desc2", skillset=ss)
         await client.create_or_update_skillset(skillset2)
@@ -220,14 +311,16 @@ class SearchSkillsetClientTest(AzureMgmtTestCase):
         assert result.name == "test-ss"
         assert result.description == "desc2"
 
-    @SearchResourceGroupPreparer(random_name_enabled=True)
-    @SearchServicePreparer(schema=SCHEMA, index_batch=BATCH)
+    @SearchResourceGroupPreparer(random_name_enabled=True, use_cache=True)
+    @SearchServicePreparer(schema=_schema, index_batch=_batch, use_cache=True)
+    @await_prepared_test
+    @recorded_by_proxy_async
     async def test_create_or_update_skillset_if_unchanged(self, api_key, endpoint, index_name, **kwargs):
-        client = SearchIndexerClient(endpoint, AzureKeyCredential(api_key))
-        s = EntityRecognitionSkill(inputs=[InputFieldMappingEntry(name="text", source="/document/content")],
-                                   outputs=[OutputFieldMappingEntry(name="organizations", target_name="organizations")])
+        client = self._get_client(endpoint, api_key)
+        await self._reset_skillsets(client)
+        s = _default_skill()
 
-        skillset1 = SearchIndexerSkillset(name='test-ss', skills=list([s]), description="desc1")
+        skillset1 = SearchIndexerSkillset(name='test-ss', skills=[s], description="desc1")
         ss = await client.create_or_update_skillset(skillset1)
         etag = ss.e_tag
 
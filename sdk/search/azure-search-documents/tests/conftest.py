@@ -7,8 +7,20 @@
 import sys
 
 import pytest
+from devtools_testutils import add_general_regex_sanitizer, add_remove_header_sanitizer, test_proxy
 
 # Ignore async tests for Python < 3.5
 collect_ignore = []
 if sys.version_info < (3, 5):
     collect_ignore.append("async_tests")
+
+
+@pytest.fixture(scope="session")
+def add_sanitizers(test_proxy):
+    # used by tests recorded with the test proxy; keeps admin keys out of recordings
+    add_remove_header_sanitizer(headers="api-key")
+    # cached services are named after whichever test created them first; normalize the name so
+    # recordings do not depend on test selection or order
+    add_general_regex_sanitizer(
+        regex=r"(?<=https://)[a-z0-9-]+(?=\.search\.windows\.net)", value="fakesearchservice"
+    )
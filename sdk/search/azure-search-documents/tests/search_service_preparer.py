@@ -41,6 +41,7 @@ class SearchServicePreparer(AzureMgmtPreparer):
         disable_recording=True,
         playback_fake_resource=None,
         client_kwargs=None,
+        use_cache=False,
     ):
         super(SearchServicePreparer, self).__init__(
             name_prefix,
@@ -54,6 +55,24 @@ class SearchServicePreparer(AzureMgmtPreparer):
         self.index_name = None
         self.index_batch = index_batch
         self.service_name = "TEST-SERVICE-NAME"
+        if use_cache:
+            self.set_cache(
+                use_cache,
+                name_prefix,
+                resource_group_parameter_name,
+                self._schema_cache_key(schema),
+                index_batch is not None,
+            )
+
+    @staticmethod
+    def _schema_cache_key(schema):
+        # cached services are only interchangeable if they were created with the same index;
+        # key on the index name (or the loader itself) rather than hashing the whole schema
+        if not schema or callable(schema):
+            return schema
+        if isinstance(schema, dict):
+            return schema["name"]
+        return json.loads(schema)["name"]
 
     def _get_resource_group(self, **kwargs):
         try:
@@ -66,10 +85,10 @@ class SearchServicePreparer(AzureMgmtPreparer):
             raise AzureTestError(template.format(ResourceGroupPreparer.__name__))
 
     def create_resource(self, name, **kwargs):
-        if self.schema:
-            schema = json.loads(self.schema)
-        else:
-            schema = None
+        # schema may be passed as the raw JSON text, already parsed, or as a loader for either
+        schema = self.schema() if callable(self.schema) else self.schema
+        if schema and not isinstance(schema, dict):
+            schema = json.loads(schema)
         self.service_name = self.create_random_name()
         self.endpoint = "https://{}.search.windows.net".format(self.service_name)
 
@@ -120,7 +139,7 @@ class SearchServicePreparer(AzureMgmtPreparer):
             response = requests.post(
                 SERVICE_URL_FMT.format(self.service_name),
                 headers={"Content-Type": "application/json", "api-key": api_key},
-                data=self.schema,
+                data=json.dumps(schema),
             )
             if response.status_code != 201:
                 raise AzureTestError(
@@ -134,7 +153,9 @@ class SearchServicePreparer(AzureMgmtPreparer):
             from azure.search.documents import SearchClient
             from azure.search.documents._generated.models import IndexBatch
 
-            batch = IndexBatch.deserialize(self.index_batch)
+            # index_batch may be a loader so that playback runs never read the batch file
+            index_batch = self.index_batch() if callable(self.index_batch) else self.index_batch
+            batch = IndexBatch.deserialize(index_batch)
             index_client = SearchClient(
                 self.endpoint, self.index_name, AzureKeyCredential(api_key)
             )
@@ -3,11 +3,15 @@
 # Licensed under the MIT License. See License.txt in the project root for
 # license information.
 # --------------------------------------------------------------------------
-import json
 from os.path import dirname, join, realpath
 
 import pytest
 
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
 from devtools_testutils import AzureMgmtTestCase
 from azure_devtools.scenario_tests import ReplayableTest
 from search_service_preparer import SearchServicePreparer, SearchResourceGroupPreparer
@@ -29,10 +33,8 @@ from azure.search.documents.indexes import SearchIndexerClient
 
 CWD = dirname(realpath(__file__))
 SCHEMA = open(join(CWD, "hotel_schema.json")).read()
-try:
-    BATCH = json.load(open(join(CWD, "hotel_small.json")))
-except UnicodeDecodeError:
-    BATCH = json.load(open(join(CWD, "hotel_small.json"), encoding='utf-8'))
+with open(join(CWD, "hotel_small.json"), "rb") as f:
+    BATCH = _json_loads(f.read())
 TIME_TO_SLEEP = 5
 
 class SearchSkillsetClientTest(AzureMgmtTestCase):